@@ -0,0 +1,39 @@
+import socket
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 所有工具共享的 requests.Session
+# 复用到 api.modellink.online 的 TCP/TLS 连接（连接池 + keep-alive），
+# 避免每次调用都重新进行 DNS 解析和 TLS 握手
+_retry_strategy = Retry(
+    total=3,  # 最多重试3次
+    backoff_factor=0.2,
+    status_forcelist=[500, 502, 503, 504],  # 这些状态码会触发重试
+)
+# TCP_NODELAY 关闭 Nagle 缓冲，SSE 等小块读写不再等凑满整包；
+# SO_KEEPALIVE 让池中空闲的长连接保活，避免被中间设备静默断开
+_SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+class _TunedHTTPAdapter(HTTPAdapter):
+    """把自定义 socket 选项传给 urllib3 连接池的 HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = _SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+
+# pool_maxsize 需要覆盖 BananaGen 最多 14 张参考图片的并发下载加上生成请求本身，
+# 保证并发下载全部走连接池而不会阻塞等待空闲连接
+_adapter = _TunedHTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=_retry_strategy,
+)
+
+session = requests.Session()
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
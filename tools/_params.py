@@ -0,0 +1,17 @@
+from typing import Any, Dict, Iterable
+
+# Dify 把未填写的变量以 'variable' 占位符传入，连同 None 和空串一并视为未提供
+_EMPTY_VALUES = (None, '', 'variable')
+
+def clean_params(params: Dict[str, Any], keys: Iterable[str]) -> Dict[str, Any]:
+    """按 keys 单次过滤 params，丢弃未填写的参数值
+
+    替代各工具里逐参数调用的 process_param/get_param 辅助函数，
+    一次遍历完成取值与过滤。
+    """
+    result: Dict[str, Any] = {}
+    for key in keys:
+        value = params.get(key)
+        if value not in _EMPTY_VALUES:
+            result[key] = value
+    return result
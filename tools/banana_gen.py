@@ -1,15 +1,32 @@
 from collections.abc import Generator
 from typing import Any, Dict, List
 import base64
-import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-import requests
-import random
-import string
+import secrets
+
+from tools._http import session
+from tools._json import json_dumps, json_loads
+
+# pybase64 提供 SIMD 加速的 base64 编解码（多 MB 的图片数据上快数倍），未安装时回退到标准库
+try:
+    import pybase64
+
+    def _b64encode_str(data) -> str:
+        # b64encode_as_string 直接产出 str，省去 bytes -> str 的一次完整拷贝
+        return pybase64.b64encode_as_string(data)
+except ImportError:
+    pybase64 = base64
+
+    def _b64encode_str(data) -> str:
+        return base64.b64encode(data).decode('utf-8')
+
+# 解码函数绑定为模块级引用，多图循环中省去逐次属性查找
+_b64decode = pybase64.b64decode
 
 # 导入 logging 和自定义处理器
 from dify_plugin.config.logger_format import plugin_logger_handler
@@ -19,18 +36,38 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
 
+# MIME 类型到文件扩展名的映射
+_MIME_TO_EXT = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp'
+}
+
 class BananaGenTool(Tool):
+    # 固定的 API host、端点模板与基础请求头，避免每次调用重建
+    _HOST = "https://api.modellink.online"
+    _ENDPOINT_TMPL = _HOST + "/v1beta/models/{model}:generateContent"
+    _BASE_HEADERS = {'Content-Type': 'application/json'}
+
     def _download_image_as_base64(self, url: str) -> Dict[str, str]:
         """从 URL 下载图片并转换为 base64"""
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # 确定 MIME 类型
-            content_type = response.headers.get('content-type', 'image/png')
-            
-            # 转换为 base64
-            base64_data = base64.b64encode(response.content).decode('utf-8')
+            with session.get(url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+
+                # 确定 MIME 类型
+                content_type = response.headers.get('content-type', 'image/png')
+
+                # 流式分块下载，直接累积到 bytearray，避免 requests 内部再整体缓存一份
+                buf = bytearray()
+                for chunk in response.iter_content(chunk_size=65536):
+                    if chunk:
+                        buf += chunk
+
+            # 转换为 base64（编码器直接接受 bytearray，无需再拷贝成 bytes）
+            base64_data = _b64encode_str(buf)
             
             return {
                 'data': base64_data,
@@ -41,20 +78,11 @@ class BananaGenTool(Tool):
     
     def _get_file_extension_from_mime_type(self, mime_type: str) -> str:
         """从 MIME 类型获取文件扩展名"""
-        mime_map = {
-            'image/png': 'png',
-            'image/jpeg': 'jpg',
-            'image/jpg': 'jpg',
-            'image/gif': 'gif',
-            'image/webp': 'webp'
-        }
-        return mime_map.get(mime_type, 'png')
+        return _MIME_TO_EXT.get(mime_type, 'png')
     
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         """调用 Nano Banana 图生生成 API"""
         try:
-            # 使用固定的 API host
-            host = "https://api.modellink.online"
             api_key = tool_parameters.get('api_key')
             model = tool_parameters.get('model')
             prompt = tool_parameters.get('prompt')
@@ -63,10 +91,10 @@ class BananaGenTool(Tool):
             size = tool_parameters.get('size')
             
             # 使用插件内置的日志记录
-            logger.info(f'[BananaGen] 开始生成图像，模型: {model}, 提示词: {prompt}')
+            logger.info('[BananaGen] 开始生成图像，模型: %s, 提示词: %s', model, prompt)
             
             # 构建 API 端点
-            endpoint = f"{host}/v1beta/models/{model}:generateContent"
+            endpoint = self._ENDPOINT_TMPL.format(model=model)
             
             # 构建请求的 parts
             parts = []
@@ -99,33 +127,39 @@ class BananaGenTool(Tool):
             
             max_images = min(len(urls_to_process), 14)
             if max_images > 0:
-                logger.info(f'[BananaGen] 处理 {max_images} 张参考图片')
+                logger.info('[BananaGen] 处理 %d 张参考图片', max_images)
                 
-                for i in range(max_images):
-                    image_url = urls_to_process[i]
-                    try:
-                        # 确保 URL 是完整的，添加 API host 前缀
-                        if not image_url.startswith('http'):
-                            # 处理相对路径，添加完整的 API host
-                            if image_url.startswith('/'):
-                                image_url = f"https://api.modellink.online{image_url}"
-                            else:
-                                image_url = f"https://api.modellink.online/{image_url}"
-                        
-                        # 下载图片并转换为 base64
-                        image_data = self._download_image_as_base64(image_url)
-                        
-                        parts.append({
-                            'inlineData': {
-                                'mimeType': image_data['mimeType'],
-                                'data': image_data['data']
-                            }
-                        })
-                        
-                        logger.info(f'[BananaGen] 参考图片 {i + 1} 处理完成')
-                    except Exception as e:
-                        logger.warning(f'[BananaGen] 参考图片 {i + 1} 处理失败: {str(e)}')
-                        # 继续处理其他图片，不中断流程
+                # 确保 URL 是完整的，添加 API host 前缀
+                normalized_urls = []
+                for image_url in urls_to_process[:max_images]:
+                    if not image_url.startswith('http'):
+                        # 处理相对路径，添加完整的 API host
+                        if image_url.startswith('/'):
+                            image_url = f"{self._HOST}{image_url}"
+                        else:
+                            image_url = f"{self._HOST}/{image_url}"
+                    normalized_urls.append(image_url)
+
+                # 并发下载参考图片（纯 I/O 等待），总耗时从逐张累加降为最慢一张
+                with ThreadPoolExecutor(max_workers=max_images) as executor:
+                    futures = [executor.submit(self._download_image_as_base64, url) for url in normalized_urls]
+
+                    # 按提交顺序收集结果，保证 parts 中参考图片顺序稳定
+                    for i, future in enumerate(futures):
+                        try:
+                            image_data = future.result()
+
+                            parts.append({
+                                'inlineData': {
+                                    'mimeType': image_data['mimeType'],
+                                    'data': image_data['data']
+                                }
+                            })
+
+                            logger.info('[BananaGen] 参考图片 %d 处理完成', i + 1)
+                        except Exception as e:
+                            logger.warning('[BananaGen] 参考图片 %d 处理失败: %s', i + 1, e)
+                            # 继续处理其他图片，不中断流程
             
             # 构建 generationConfig
             generation_config = {
@@ -153,29 +187,15 @@ class BananaGenTool(Tool):
                 'generationConfig': generation_config
             }
             
-            logger.info(f'[BananaGen] 发送请求到: {endpoint}')
-            logger.debug(f'[BananaGen] 请求体: {json.dumps(request_body, indent=2)}')
+            logger.info('[BananaGen] 发送请求到: %s', endpoint)
+            # 请求体包含 base64 编码的参考图片（可达数 MB），仅在 DEBUG 级别开启时才序列化
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('[BananaGen] 请求体: %s', json_dumps(request_body))
             
-            # 发送 API 请求
-            headers = {
-                'Content-Type': 'application/json',
-                'x-goog-api-key': api_key
-            }
+            # 发送 API 请求（仅 api_key 为逐次变化的请求头）
+            headers = {**self._BASE_HEADERS, 'x-goog-api-key': api_key}
             
-            # 使用 Session 和重试机制来处理网络不稳定的情况
-            from requests.adapters import HTTPAdapter
-            from urllib3.util.retry import Retry
-
-            session = requests.Session()
-            retry_strategy = Retry(
-                total=3,  # 最多重试3次
-                backoff_factor=1,  # 重试间隔：1s, 2s, 4s
-                status_forcelist=[500, 502, 503, 504],  # 这些状态码会触发重试
-            )
-            adapter = HTTPAdapter(max_retries=retry_strategy)
-            session.mount("https://", adapter)
-            session.mount("http://", adapter)
-
+            # 使用共享 Session（连接池 + 重试机制）来处理网络不稳定的情况
             # 使用流式读取来处理大响应（图片 base64 数据很大）
             response = session.post(
                 endpoint,
@@ -187,20 +207,23 @@ class BananaGenTool(Tool):
 
             if not response.ok:
                 error_message = f'HTTP {response.status_code}: {response.reason}'
-                try:
-                    error_data = response.json()
-                    if 'error' in error_data:
-                        if isinstance(error_data['error'], str):
-                            error_message = error_data['error']
-                        elif isinstance(error_data['error'], dict) and 'message' in error_data['error']:
-                            error_message = error_data['error']['message']
-                        else:
-                            error_message = json.dumps(error_data['error'])
-                    elif 'message' in error_data:
-                        error_message = error_data['message']
-                except Exception:
-                    # 无法解析 JSON，使用默认错误信息
-                    pass
+                # 错误响应只读取一次；异常大的 payload 直接跳过解析，用默认错误信息兜底
+                error_content = response.content
+                if len(error_content) < 65536:
+                    try:
+                        error_data = json_loads(error_content)
+                        if 'error' in error_data:
+                            if isinstance(error_data['error'], str):
+                                error_message = error_data['error']
+                            elif isinstance(error_data['error'], dict) and 'message' in error_data['error']:
+                                error_message = error_data['error']['message']
+                            else:
+                                error_message = json_dumps(error_data['error'])
+                        elif 'message' in error_data:
+                            error_message = error_data['message']
+                    except Exception:
+                        # 无法解析 JSON，使用默认错误信息
+                        pass
                 raise Exception(f'API 请求失败: {error_message}')
 
             # 流式分块读取响应内容，避免 IncompleteRead 错误
@@ -210,61 +233,65 @@ class BananaGenTool(Tool):
                     if chunk:
                         chunks.append(chunk)
                 response_content = b''.join(chunks)
-                result = json.loads(response_content.decode('utf-8'))
+                result = json_loads(response_content)
             except Exception as e:
-                logger.error(f'[BananaGen] 读取响应失败: {str(e)}')
+                logger.error('[BananaGen] 读取响应失败: %s', e)
                 raise Exception(f'读取 API 响应失败: {str(e)}')
-            logger.debug(f'[BananaGen] API 响应: {json.dumps(result, indent=2)}')
-            
-            # 提取所有生成的图片数据（支持多张图片）
-            images = []
-            
-            if 'candidates' in result and result['candidates']:
-                candidate = result['candidates'][0]
-                if 'content' in candidate and 'parts' in candidate['content']:
-                    for part in candidate['content']['parts']:
-                        if 'inlineData' in part and 'data' in part['inlineData']:
-                            images.append({
-                                'data': part['inlineData']['data'],
-                                'mimeType': part['inlineData'].get('mimeType', 'image/png')
-                            })
-            
-            if not images:
-                raise Exception('未能从响应中提取图片数据')
-            
-            logger.info(f'[BananaGen] 成功提取 {len(images)} 张图片，开始处理返回')
+            # 响应中包含生成图片的 base64 数据，同样只在 DEBUG 级别序列化
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('[BananaGen] API 响应: %s', json_dumps(result))
             
-            # 直接使用 Dify 的 create_blob_message 返回图片，避免页面卡顿和外部依赖
-            for i, image in enumerate(images):
+            # 提取生成的图片数据（支持多张图片）
+            content_parts = []
+            candidates = result.get('candidates') or []
+            if candidates:
+                content_parts = (candidates[0].get('content') or {}).get('parts') or []
+
+            # 单次遍历 parts：每张图片解码后立即通过 create_blob_message yield，
+            # 不再先收集中间 images 列表，避免多图响应时所有 base64 数据同时驻留内存
+            # 文件名时间戳整批共用，不必每张图片都调用一次 datetime.now()
+            timestamp = int(datetime.now().timestamp())
+
+            extracted_count = 0
+            returned_count = 0
+            for part in content_parts:
+                inline_data = part.get('inlineData')
+                if not inline_data or 'data' not in inline_data:
+                    continue
+                extracted_count += 1
                 try:
                     # 解码 base64 数据为二进制
-                    image_bytes = base64.b64decode(image['data'])
-                    
-                    # 生成随机文件名
-                    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=7))
-                    file_extension = self._get_file_extension_from_mime_type(image['mimeType'])
-                    file_name = f"banana_gen_{int(datetime.now().timestamp())}_{i+1}_{random_suffix}.{file_extension}"
-                    
-                    logger.info(f'[BananaGen] 返回第 {i+1}/{len(images)} 张图片: {file_name}, 大小: {len(image_bytes)} bytes')
-                    
+                    image_bytes = _b64decode(inline_data['data'])
+                    mime_type = inline_data.get('mimeType', 'image/png')
+
+                    # 生成随机文件名（token_hex 为单次 C 调用，无需逐字符采样）
+                    random_suffix = secrets.token_hex(4)[:7]
+                    file_extension = self._get_file_extension_from_mime_type(mime_type)
+                    file_name = 'banana_gen_%d_%d_%s.%s' % (timestamp, extracted_count, random_suffix, file_extension)
+
+                    logger.info('[BananaGen] 返回第 %d 张图片: %s, 大小: %d bytes', extracted_count, file_name, len(image_bytes))
+
                     # 使用 Dify 的 create_blob_message 直接返回图片二进制数据
                     yield self.create_blob_message(
                         blob=image_bytes,
                         meta={
                             'file_name': file_name,
-                            'mime_type': image['mimeType']
+                            'mime_type': mime_type
                         }
                     )
-                    
+                    returned_count += 1
+
                 except Exception as e:
-                    logger.error(f'[BananaGen] 处理第 {i+1} 张图片失败: {str(e)}')
+                    logger.error('[BananaGen] 处理第 %d 张图片失败: %s', extracted_count, e)
                     continue
-            
-            # 如果需要，也可以返回一个总结 JSON 消息
-            logger.info(f'[BananaGen] 图片处理完成，共返回 {len(images)} 张图片')
+
+            if extracted_count == 0:
+                raise Exception('未能从响应中提取图片数据')
+
+            logger.info('[BananaGen] 图片处理完成，共返回 %d 张图片', returned_count)
             
         except Exception as e:
-            logger.error(f'[BananaGen] 生成图像失败: {str(e)}')
+            logger.error('[BananaGen] 生成图像失败: %s', e)
             yield self.create_json_message({
                 'success': False,
                 'error': str(e)
@@ -3,7 +3,9 @@ from typing import Any, Dict
 import logging
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-import requests
+
+from tools._http import session
+from tools._json import json_loads
 
 # 导入 logging 和自定义处理器
 from dify_plugin.config.logger_format import plugin_logger_handler
@@ -13,6 +15,10 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
 
+def _process_param(value):
+    """参数值为 'variable' 时视为未填写"""
+    return None if value == 'variable' else value
+
 class KlingusImage2VideoTool(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         """Klingus Image to Video Generation API 封装"""
@@ -35,24 +41,19 @@ class KlingusImage2VideoTool(Tool):
             enable_audio = tool_parameters.get('enable_audio', True)
             
             # 处理参数值为'variable'的情况
-            def process_param(value):
-                if value == 'variable':
-                    return None
-                return value
-            
-            api_key = process_param(api_key)
-            model_name = process_param(model_name)
-            prompt = process_param(prompt)
-            negative_prompt = process_param(negative_prompt)
-            image = process_param(image)
-            image_tail = process_param(image_tail)
-            cfg_scale = process_param(cfg_scale)
-            mode = process_param(mode)
-            aspect_ratio = process_param(aspect_ratio)
-            duration = process_param(duration)
-            callback_url = process_param(callback_url)
-            external_task_id = process_param(external_task_id)
-            enable_audio = process_param(enable_audio)
+            api_key = _process_param(api_key)
+            model_name = _process_param(model_name)
+            prompt = _process_param(prompt)
+            negative_prompt = _process_param(negative_prompt)
+            image = _process_param(image)
+            image_tail = _process_param(image_tail)
+            cfg_scale = _process_param(cfg_scale)
+            mode = _process_param(mode)
+            aspect_ratio = _process_param(aspect_ratio)
+            duration = _process_param(duration)
+            callback_url = _process_param(callback_url)
+            external_task_id = _process_param(external_task_id)
+            enable_audio = _process_param(enable_audio)
             
             logger.info(f'[Klingus Image2Video] 开始生成视频，模型: {model_name}')
             
@@ -88,7 +89,7 @@ class KlingusImage2VideoTool(Tool):
                 'Authorization': f'Bearer {api_key}'
             }
             
-            response = requests.post(api_url, headers=headers, json=request_data, timeout=60)
+            response = session.post(api_url, headers=headers, json=request_data, timeout=60)
             
             logger.info(f'[Klingus Image2Video] 响应状态: {response.status_code}')
             
@@ -97,7 +98,7 @@ class KlingusImage2VideoTool(Tool):
                 logger.error(f'[Klingus Image2Video] 错误响应: {error_text}')
                 raise Exception(f'API 请求失败: {response.status_code} - {error_text}')
             
-            result = response.json()
+            result = json_loads(response.content)
             logger.info(f'[Klingus Image2Video] 请求成功，任务 ID: {result.get("data", {}).get("task_id")}')
             
             # 构建返回结果
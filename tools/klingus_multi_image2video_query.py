@@ -3,7 +3,9 @@ from typing import Any, Dict
 import logging
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-import requests
+
+from tools._http import session
+from tools._json import json_loads
 
 # 导入 logging 和自定义处理器
 from dify_plugin.config.logger_format import plugin_logger_handler
@@ -13,6 +15,10 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
 
+def _process_param(value):
+    """参数值为 'variable' 时视为未填写"""
+    return None if value == 'variable' else value
+
 class KlingusMultiImage2VideoQueryTool(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         """Klingus Multi Image to Video Query API 封装"""
@@ -24,13 +30,8 @@ class KlingusMultiImage2VideoQueryTool(Tool):
             task_id = tool_parameters.get('task_id')
             
             # 处理参数值为'variable'的情况
-            def process_param(value):
-                if value == 'variable':
-                    return None
-                return value
-            
-            api_key = process_param(api_key)
-            task_id = process_param(task_id)
+            api_key = _process_param(api_key)
+            task_id = _process_param(task_id)
             
             logger.info(f'[Klingus MultiImage2Video Query] 查询任务，任务 ID: {task_id}')
             
@@ -42,7 +43,7 @@ class KlingusMultiImage2VideoQueryTool(Tool):
             }
             
             # 发送请求
-            response = requests.get(api_url, headers=headers, timeout=60)
+            response = session.get(api_url, headers=headers, timeout=60)
             
             logger.info(f'[Klingus MultiImage2Video Query] 响应状态: {response.status_code}')
             
@@ -55,7 +56,7 @@ class KlingusMultiImage2VideoQueryTool(Tool):
                 raise Exception(f'API 请求失败: {response.status_code} - {response_content}')
             
             try:
-                result = response.json()
+                result = json_loads(response.content)
                 logger.info(f'[Klingus MultiImage2Video Query] 查询成功，任务状态: {result.get("data", {}).get("task_status")}')
             except ValueError as e:
                 logger.error(f'[Klingus MultiImage2Video Query] JSON 解析失败: {e}，响应内容: {response_content}')
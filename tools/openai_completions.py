@@ -1,10 +1,11 @@
 from collections.abc import Generator
 from typing import Any, Dict, Optional
-import json
 import logging
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-import requests
+
+from tools._http import session
+from tools._json import json_dumps, json_loads
 
 from dify_plugin.config.logger_format import plugin_logger_handler
 
@@ -12,71 +13,118 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
 
+# 接口地址固定，提升为模块常量，避免每次调用重新拼接
+_API_URL = "https://api.modellink.online/v1/chat/completions"
+
+# 可选参数映射表：tool_parameters 中的键 -> 请求体中的键；值为 'variable' 视为未填写
+_OPTIONAL_PARAMS = (
+    ('temperature', 'temperature'),
+    ('maxCompletionTokens', 'max_completion_tokens'),
+    ('topP', 'top_p'),
+    ('frequencyPenalty', 'frequency_penalty'),
+    ('presencePenalty', 'presence_penalty'),
+    ('n', 'n'),
+    ('stop', 'stop'),
+    ('responseFormat', 'response_format'),
+    ('reasoningEffort', 'reasoning_effort'),
+    ('seed', 'seed'),
+    ('logitBias', 'logit_bias'),
+    ('logprobs', 'logprobs'),
+    ('topLogprobs', 'top_logprobs'),
+)
+
+def _iter_sse_lines(response):
+    """按换行符手工切分字节流，逐行产出原始 bytes
+
+    iter_lines 在 Python 层逐块扫描换行并维护缓冲，还有块边界截断的已知问题；
+    这里改用 C 实现的 bytes.rpartition / bytes.split（底层 memchr）切分。
+    按单个 \\n 切行以同时兼容 LF 与 CRLF 的流（SSE 规范允许两种行尾），
+    行尾残留的 \\r 由调用方的 strip 去除。
+    """
+    buffer = b''
+    for data in response.iter_content(chunk_size=8192):
+        if not data:
+            continue
+        buffer += data
+        if b'\n' not in data:
+            continue
+        # 最后一个换行符之前的部分都是完整行，之后的残行留待下一块
+        complete, _, buffer = buffer.rpartition(b'\n')
+        yield from complete.split(b'\n')
+    # 流结束时缓冲里可能还剩未以换行收尾的最后一行
+    if buffer:
+        yield buffer
+
 class OpenAICompletionsTool(Tool):
-    def _stream_chat_completion(self, api_url: str, headers: Dict[str, Any], request_body: Dict[str, Any]) -> Dict[str, Any]:
-        """以流式方式调用 Chat Completions 并在方法内部聚合完整文本后返回结果"""
-        accumulated_text = ""
+    def _stream_chat_completion(self, api_url: str, headers: Dict[str, Any], request_body: Dict[str, Any]) -> Generator[tuple, None, None]:
+        """以流式方式调用 Chat Completions，边收边产出增量
+
+        产出 ('delta', 文本增量) 序列，流结束后以 ('final', 聚合结果) 收尾，
+        让调用方在首个 token 到达时即可向用户转发，而不是等整个流收完。
+        """
+        # 增量文本先收集到列表，最后一次性 join，避免逐段字符串拼接的 O(N^2) 拷贝
+        accumulated_pieces: list = []
         finish_reason: Optional[str] = None
         model_id: Optional[str] = None
         completion_id: Optional[str] = None
         created_ts: Optional[int] = None
 
-        response = requests.post(api_url, headers=headers, json=request_body, timeout=600, stream=True)
-
-        logger.info(f'[OpenAI Completions] 响应状态: {response.status_code}')
-        if not response.ok:
-            error_text = response.text
-            logger.error(f'[OpenAI Completions] 错误响应: {error_text}')
-            raise Exception(f'API 请求失败: {response.status_code} - {error_text}')
-
-        content_type = response.headers.get('Content-Type', '') or response.headers.get('content-type', '')
-        charset = 'utf-8'
-        if 'charset=' in content_type:
-            try:
-                charset = content_type.split('charset=')[-1].split(';')[0].strip()
-            except Exception:
-                charset = 'utf-8'
-        if not response.encoding:
-            response.encoding = charset
-
-        for raw_line in response.iter_lines(decode_unicode=False):
-            if raw_line is None:
-                continue
-            try:
-                line = raw_line.decode(charset, errors='replace').lstrip('\ufeff').strip()
-            except Exception:
-                line = raw_line.decode('utf-8', errors='replace').lstrip('\ufeff').strip()
-            if not line:
-                continue
-            if line.startswith('data:'):
-                payload = line[len('data:'):].strip()
-                if payload == '[DONE]':
-                    break
-                try:
-                    chunk = json.loads(payload)
-                except Exception:
+        # with 保证任何退出路径（[DONE]、提前 break、解析异常、调用方中断生成器）
+        # 都会关闭响应，把连接干净地归还连接池
+        with session.post(api_url, headers=headers, json=request_body, timeout=600, stream=True) as response:
+            logger.info('[OpenAI Completions] 响应状态: %s', response.status_code)
+            if not response.ok:
+                error_text = response.text
+                logger.error('[OpenAI Completions] 错误响应: %s', error_text)
+                raise Exception(f'API 请求失败: {response.status_code} - {error_text}')
+
+            # SSE 流按字节处理、JSON 载荷规定为 UTF-8，无需再从 Content-Type 嗅探 charset
+
+            # 热循环前绑定局部引用，每个 chunk 省去全局与属性查找
+            _loads = json_loads
+            _append = accumulated_pieces.append
+
+            for raw_line in _iter_sse_lines(response):
+                if not raw_line:
                     continue
+                # SSE 的帧格式是 ASCII，前缀判断直接在 bytes 上进行；
+                # payload 原样交给 json_loads（接受 bytes），整行无需 decode
+                if raw_line.startswith(b'\xef\xbb\xbf'):
+                    raw_line = raw_line[3:]
+                line = raw_line.strip()
+                if not line:
+                    continue
+                if line.startswith(b'data:'):
+                    payload = line[5:].strip()
+                    if payload == b'[DONE]':
+                        break
+                    try:
+                        chunk = _loads(payload)
+                    except Exception:
+                        continue
 
-                model_id = chunk.get('model') or model_id
-                completion_id = chunk.get('id') or completion_id
-                created_ts = chunk.get('created') or created_ts
-
-                choices = chunk.get('choices') or []
-                if choices:
-                    c0 = choices[0]
-                    finish_reason = c0.get('finish_reason') or finish_reason
-                    delta = c0.get('delta') or {}
-                    if isinstance(delta, dict):
-                        piece = delta.get('content')
-                        if piece:
-                            accumulated_text += piece
-                    else:
-                        msg = c0.get('message') or {}
-                        if isinstance(msg, dict):
-                            piece2 = msg.get('content')
-                            if piece2:
-                                accumulated_text += piece2
+                    model_id = chunk.get('model') or model_id
+                    completion_id = chunk.get('id') or completion_id
+                    created_ts = chunk.get('created') or created_ts
+
+                    choices = chunk.get('choices') or []
+                    if choices:
+                        c0 = choices[0]
+                        finish_reason = c0.get('finish_reason') or finish_reason
+                        # 流式 chunk 只会携带 delta（message 只出现在非流式响应里），
+                        # 不再保留永远走不到的 message 回退分支
+                        delta = c0.get('delta')
+                        if isinstance(delta, dict):
+                            piece = delta.get('content')
+                            if piece:
+                                _append(piece)
+                                yield ('delta', piece)
 
+                        # finish_reason 出现后不会再有内容增量，无需等到 [DONE]
+                        if finish_reason:
+                            break
+
+        accumulated_text = ''.join(accumulated_pieces)
         result: Dict[str, Any] = {
             'success': True,
             'message': '对话成功',
@@ -93,114 +141,114 @@ class OpenAICompletionsTool(Tool):
                 'serviceTier': None
             }
         }
-        return result
+        yield ('final', result)
 
 
+    def _build_request_body(self, tool_parameters: Dict[str, Any], messages: Any, prompt: Optional[str], model: str) -> Dict[str, Any]:
+        """构建 Chat Completions 请求体：规范化 messages 并按映射表填充可选参数"""
+        conversation_messages = []
+        if messages and isinstance(messages, list) and len(messages) > 0:
+            # 快路径：消息已是 OpenAI 期望的形态（role + str/list content）时直接透传，
+            # 跳过逐条的类型分派与字典重建
+            if all(
+                isinstance(msg, dict) and 'role' in msg
+                and isinstance(msg.get('content'), (str, list)) and msg.get('content')
+                for msg in messages
+            ):
+                conversation_messages = messages
+            else:
+                for msg in messages:
+                    content = msg.get('content')
+                    if not content:
+                        continue
+                    # 绝大多数消息的 content 是纯字符串，用精确类型判断先走快路径，
+                    # 跳过后面的 isinstance 链
+                    if type(content) is str:
+                        conversation_messages.append({
+                            'role': msg.get('role', 'user'),
+                            'content': content
+                        })
+                        continue
+                    if isinstance(content, (str, list)):
+                        formatted_content = content
+                    elif isinstance(content, dict):
+                        text = content.get('text') or content.get('content')
+                        if text:
+                            formatted_content = [{
+                                'type': 'text',
+                                'text': text
+                            }]
+                        else:
+                            formatted_content = json_dumps(content)
+                    else:
+                        formatted_content = str(content)
+
+                    conversation_messages.append({
+                        'role': msg.get('role', 'user'),
+                        'content': formatted_content
+                    })
+        elif prompt:
+            conversation_messages.append({
+                'role': 'user',
+                'content': prompt
+            })
+        else:
+            raise Exception('必须提供 messages 或 prompt 参数')
+
+        request_body: Dict[str, Any] = {
+            'model': model,
+            'messages': conversation_messages
+        }
+
+        # 按映射表填充可选参数，单次 get 即完成取值与 'variable' 哨兵过滤
+        for src, dst in _OPTIONAL_PARAMS:
+            value = tool_parameters.get(src)
+            if value is not None and value != 'variable':
+                request_body[dst] = value
+
+        request_body['stream'] = True
+        return request_body
+
     def _invoke(self, tool_parameters: Dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
         """调用 Chat Completions 接口，支持标准 OpenAI API 格式与流式聚合"""
         try:
-            host = "https://api.modellink.online"
             apiKey = tool_parameters.get('apiKey')
             messages = tool_parameters.get('messages', [])
+            # 上游节点常把 messages 作为已序列化的 JSON 文本传入，仅解析这一次；
+            # 解析出的列表随后走 _build_request_body 的透传快路径，不再逐条重建。
+            # 解析失败时置空回退到 prompt 路径，与 openai_responses.py 的处理一致
+            if isinstance(messages, (str, bytes)) and messages:
+                try:
+                    messages = json_loads(messages)
+                except Exception:
+                    messages = []
             prompt = tool_parameters.get('prompt')
             model = tool_parameters.get('model', 'gpt-4o')
 
-            temperature = tool_parameters.get('temperature') if tool_parameters.get('temperature') != 'variable' else None
-            maxCompletionTokens = tool_parameters.get('maxCompletionTokens') if tool_parameters.get('maxCompletionTokens') != 'variable' else None
-            topP = tool_parameters.get('topP') if tool_parameters.get('topP') != 'variable' else None
-            frequencyPenalty = tool_parameters.get('frequencyPenalty') if tool_parameters.get('frequencyPenalty') != 'variable' else None
-            presencePenalty = tool_parameters.get('presencePenalty') if tool_parameters.get('presencePenalty') != 'variable' else None
-            n = tool_parameters.get('n') if tool_parameters.get('n') != 'variable' else None
-            stop = tool_parameters.get('stop') if tool_parameters.get('stop') != 'variable' else None
-            responseFormat = tool_parameters.get('responseFormat') if tool_parameters.get('responseFormat') != 'variable' else None
-            reasoningEffort = tool_parameters.get('reasoningEffort') if tool_parameters.get('reasoningEffort') != 'variable' else None
-            seed = tool_parameters.get('seed') if tool_parameters.get('seed') != 'variable' else None
-            logitBias = tool_parameters.get('logitBias') if tool_parameters.get('logitBias') != 'variable' else None
-            logprobs = tool_parameters.get('logprobs') if tool_parameters.get('logprobs') != 'variable' else None
-            topLogprobs = tool_parameters.get('topLogprobs') if tool_parameters.get('topLogprobs') != 'variable' else None
-
-            logger.info(f'[OpenAI Completions] 开始对话，模型: {model}')
-
-            conversation_messages = []
-            if messages and isinstance(messages, list) and len(messages) > 0:
-                for msg in messages:
-                    content = msg.get('content')
-                    if content:
-                        formatted_content = content
-                        if isinstance(content, str):
-                            formatted_content = content
-                        elif isinstance(content, list):
-                            formatted_content = content
-                        elif isinstance(content, dict):
-                            text = content.get('text') or content.get('content')
-                            if text:
-                                formatted_content = [{
-                                    'type': 'text',
-                                    'text': text
-                                }]
-                            else:
-                                formatted_content = json.dumps(content)
-                        else:
-                            formatted_content = str(content)
-
-                        conversation_messages.append({
-                            'role': msg.get('role', 'user'),
-                            'content': formatted_content
-                        })
-            elif prompt:
-                conversation_messages.append({
-                    'role': 'user',
-                    'content': prompt
-                })
-            else:
-                raise Exception('必须提供 messages 或 prompt 参数')
+            logger.info('[OpenAI Completions] 开始对话，模型: %s', model)
 
-            request_body: Dict[str, Any] = {
-                'model': model,
-                'messages': conversation_messages
-            }
+            request_body = self._build_request_body(tool_parameters, messages, prompt, model)
+            # 请求体可能带多模态内容（数十 KB），仅在 INFO 生效时才做序列化
+            if logger.isEnabledFor(logging.INFO):
+                logger.info('[OpenAI Completions] 请求体: %s', json_dumps(request_body))
 
-            if temperature is not None:
-                request_body['temperature'] = temperature
-            if maxCompletionTokens is not None:
-                request_body['max_completion_tokens'] = maxCompletionTokens
-            if topP is not None:
-                request_body['top_p'] = topP
-            if frequencyPenalty is not None:
-                request_body['frequency_penalty'] = frequencyPenalty
-            if presencePenalty is not None:
-                request_body['presence_penalty'] = presencePenalty
-            if n is not None:
-                request_body['n'] = n
-            if stop is not None:
-                request_body['stop'] = stop
-            if responseFormat is not None:
-                request_body['response_format'] = responseFormat
-            if reasoningEffort is not None:
-                request_body['reasoning_effort'] = reasoningEffort
-            if seed is not None:
-                request_body['seed'] = seed
-            if logitBias is not None:
-                request_body['logit_bias'] = logitBias
-            if logprobs is not None:
-                request_body['logprobs'] = logprobs
-            if topLogprobs is not None:
-                request_body['top_logprobs'] = topLogprobs
-
-            request_body['stream'] = True
-            request_body_string = json.dumps(request_body)
-            logger.info(f'[OpenAI Completions] 请求体: {request_body_string}')
-
-            api_url = f"{host}/v1/chat/completions"
             headers = {
                 'Content-Type': 'application/json',
-                'Authorization': f'Bearer {apiKey}'
+                'Authorization': 'Bearer ' + (apiKey or ''),
+                # SSE 流要求低延迟：identity 禁止上游 gzip 的按块缓冲与解压开销，
+                # no-cache 防止中间层缓存流式响应
+                'Accept-Encoding': 'identity',
+                'Cache-Control': 'no-cache'
             }
 
-            result = self._stream_chat_completion(api_url, headers, request_body)
-            yield self.create_json_message(result)
+            # 增量文本实时转发给用户，完整的聚合结果仍以 JSON 消息收尾（保持原有输出结构）
+            for kind, payload in self._stream_chat_completion(_API_URL, headers, request_body):
+                if kind == 'delta':
+                    yield self.create_text_message(payload)
+                else:
+                    yield self.create_json_message(payload)
         except Exception as e:
-            logger.error(f'[OpenAI Completions] 异常: {str(e)}')
+            logger.error('[OpenAI Completions] 异常: %s', e)
             yield self.create_json_message({
                 'success': False,
                 'message': str(e) or '对话失败',
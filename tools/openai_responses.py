@@ -1,32 +1,87 @@
 from collections.abc import Generator
 from typing import Any, Dict, Optional, List, Union
-import json
+import functools
 import logging
+import re
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-import requests
 from urllib.parse import urlparse
 
+from tools._http import session
+from tools._json import json_dumps, json_dumps_bytes, json_loads
+
 from dify_plugin.config.logger_format import plugin_logger_handler
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
 
+# delta 事件占长流事件量的绝大多数且结构固定，先用字节子串探测事件类型，
+# 再用预编译正则直接抽取 delta 字段，跳过完整的 JSON 解析；
+# delta 含转义序列（\\n、\\uXXXX 等）时退回完整解析保证正确性
+_DELTA_EVENT_MARK = b'"type":"response.output_text.delta"'
+_DELTA_RE = re.compile(rb'"delta":"((?:[^"\\]|\\.)*)"')
+
+# SSE 行首尾需要修剪的空白字节（\r 处理 CRLF 行尾）
+_SSE_WS = b'\r \t'
+
+# 只有这几类事件携带响应元数据（model/id/created_at），delta 事件无需检查
+_META_EVENTS = frozenset({
+    'response.created',
+    'response.in_progress',
+    'response.completed',
+    'response.incomplete',
+    'response.failed',
+})
+
+# 直接透传的可选参数映射表：tool_parameters 中的键 -> 请求体中的键
+_PASSTHROUGH_PARAMS = (
+    ('instructions', 'instructions'),
+    ('temperature', 'temperature'),
+    ('topP', 'top_p'),
+    ('stop', 'stop'),
+    ('toolChoice', 'tool_choice'),
+    ('truncation', 'truncation'),
+    ('store', 'store'),
+    ('previousResponseId', 'previous_response_id'),
+)
+
+# 可能以 JSON 文本传入的结构化参数
+_JSON_PARAMS = (
+    ('tools', 'tools'),
+    ('metadata', 'metadata'),
+)
+
+def _maybe_json(value):
+    """结构化参数若以 JSON 文本传入则解析为对象；解析失败返回 None 表示丢弃"""
+    if isinstance(value, str):
+        try:
+            return json_loads(value)
+        except ValueError:
+            return None
+    return value
+
+# 消息历史里同一张图片的 URL 往往跨轮次重复出现，清理与校验结果可以缓存；
+# lru_cache 只缓存成功结果，非法 URL 每次照常抛出 ValueError
+@functools.lru_cache(maxsize=1024)
+def _sanitize_url_cached(url: str) -> str:
+    """清理并校验 URL 字符串，去除多余空白和包裹字符"""
+    cleaned = url.strip()
+    if cleaned.startswith('`') and cleaned.endswith('`'):
+        cleaned = cleaned[1:-1].strip()
+    if cleaned.endswith('\\'):
+        cleaned = cleaned[:-1]
+    parsed = urlparse(cleaned)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        raise ValueError('无效的 URL')
+    return cleaned
+
 class OpenAIResponsesTool(Tool):
     def _sanitize_url(self, url: str) -> str:
-        """清理并校验 URL 字符串，去除多余空白和包裹字符"""
+        """清理并校验 URL 字符串（结果带 LRU 缓存）"""
         if not isinstance(url, str):
             raise ValueError('URL 必须为字符串')
-        cleaned = url.strip()
-        if cleaned.startswith('`') and cleaned.endswith('`'):
-            cleaned = cleaned[1:-1].strip()
-        if cleaned.endswith('\\'):
-            cleaned = cleaned[:-1]
-        parsed = urlparse(cleaned)
-        if parsed.scheme not in ('http', 'https') or not parsed.netloc:
-            raise ValueError('无效的 URL')
-        return cleaned
+        return _sanitize_url_cached(url)
 
     def _normalize_content_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
         """规范化单个内容项"""
@@ -80,8 +135,13 @@ class OpenAIResponsesTool(Tool):
         - 简单字符串: "input": "Tell me a story"
         - 消息数组: "input": [{"role": "user", "content": [...]}]
         """
-        if prompt and (not messages or len(messages) == 0):
-            return prompt
+        if not messages:
+            return prompt or ""
+
+        # 快路径：纯文本消息占实际对话的绝大多数，一次扫描确认后直接构造，
+        # 不再逐条经过 _normalize_message_content 的类型分派
+        if all(isinstance(msg.get('content'), str) and msg.get('content') for msg in messages):
+            return [{'role': msg.get('role', 'user'), 'content': msg['content']} for msg in messages]
 
         input_messages: List[Dict[str, Any]] = []
         for msg in messages:
@@ -95,7 +155,57 @@ class OpenAIResponsesTool(Tool):
                 })
 
         return input_messages if input_messages else prompt or ""
-    def _stream_responses(self, api_url: str, headers: Dict[str, Any], request_body: Dict[str, Any]) -> Dict[str, Any]:
+
+    def _on_output_text_delta(self, event: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """处理 response.output_text.delta 事件（主要文本内容）"""
+        delta = event.get('delta', '')
+        if delta:
+            piece = str(delta)
+            state['pieces'].append(piece)
+            state['len'] += len(piece)
+            logger.debug('[OpenAI Responses] 收到 delta，当前累计长度: %d', state['len'])
+
+    def _on_completed(self, event: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """处理 response.completed 事件，必要时从完整输出兜底提取文本"""
+        state['finish_reason'] = 'stop'
+        resp = event.get('response', {})
+        # 从完成事件中提取完整文本（备用，当没有收到 delta 事件时）
+        if not state['pieces']:
+            logger.info('[OpenAI Responses] 从 response.completed 提取文本')
+            output_list = resp.get('output', [])
+            for output_item in output_list:
+                if output_item.get('type') == 'message':
+                    content_list = output_item.get('content', [])
+                    for content_item in content_list:
+                        if content_item.get('type') == 'output_text':
+                            state['pieces'].append(content_item.get('text', ''))
+
+    def _on_failed(self, event: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """处理 response.failed 事件"""
+        resp = event.get('response', {})
+        error_info = resp.get('error', {})
+        error_code = error_info.get('code', 'unknown_error')
+        error_message = error_info.get('message', 'The model failed to generate a response.')
+        logger.error(f'[OpenAI Responses] 响应失败: {error_code} - {error_message}')
+        raise Exception(f'响应失败: {error_code} - {error_message}')
+
+    def _on_generic_delta(self, event: Dict[str, Any], state: Dict[str, Any], etype: str) -> None:
+        """兼容其他 *.delta 事件"""
+        delta = event.get('delta', '')
+        if delta:
+            piece = str(delta)
+            state['pieces'].append(piece)
+            state['len'] += len(piece)
+            logger.debug('[OpenAI Responses] 收到其他 delta 事件: %s', etype)
+
+    # 事件类型到处理器的 O(1) 分发表，替代逐个比较的 if/elif 链
+    _EVENT_HANDLERS = {
+        'response.output_text.delta': _on_output_text_delta,
+        'response.completed': _on_completed,
+        'response.failed': _on_failed,
+    }
+
+    def _stream_responses(self, api_url: str, headers: Dict[str, Any], body_bytes: bytes) -> Dict[str, Any]:
         """
         以流式方式调用 Responses 接口，解析 SSE 事件并聚合 output_text 文本
 
@@ -111,14 +221,14 @@ class OpenAIResponsesTool(Tool):
         - response.completed: 响应完成
         - response.failed: 响应失败
         """
-        accumulated_text = ""
-        finish_reason: Optional[str] = None
+        # 增量片段收集到列表、长度单独计数，结束时一次性 join，
+        # 避免逐段字符串拼接的 O(N^2) 拷贝；状态以 dict 形式在处理器间共享
+        state: Dict[str, Any] = {'pieces': [], 'len': 0, 'finish_reason': None}
         model_id: Optional[str] = None
         response_id: Optional[str] = None
         created_ts: Optional[int] = None
-        error_info: Optional[Dict[str, Any]] = None
 
-        response = requests.post(api_url, headers=headers, json=request_body, timeout=600, stream=True)
+        response = session.post(api_url, headers=headers, data=body_bytes, timeout=600, stream=True)
 
         logger.info(f'[OpenAI Responses] 响应状态: {response.status_code}')
         if not response.ok:
@@ -126,93 +236,118 @@ class OpenAIResponsesTool(Tool):
             logger.error(f'[OpenAI Responses] 错误响应: {error_text}')
             raise Exception(f'API 请求失败: {response.status_code} - {error_text}')
 
-        content_type = response.headers.get('Content-Type', '') or response.headers.get('content-type', '')
-        charset = 'utf-8'
-        if 'charset=' in content_type:
-            try:
-                charset = content_type.split('charset=')[-1].split(';')[0].strip()
-            except Exception:
-                charset = 'utf-8'
-        if not response.encoding:
-            response.encoding = charset
-
-        for raw_line in response.iter_lines(decode_unicode=False):
-            if raw_line is None:
-                continue
-            try:
-                line = raw_line.decode(charset, errors='replace').lstrip('\ufeff').strip()
-            except Exception:
-                line = raw_line.decode('utf-8', errors='replace').lstrip('\ufeff').strip()
-            if not line:
-                continue
-
-            # 处理 SSE 事件格式: "event: xxx" 和 "data: xxx"
-            if line.startswith('event:'):
-                continue  # 事件类型行，跳过，数据在 data 行
-
-            if line.startswith('data:'):
-                payload = line[len('data:'):].strip()
-                if payload == '[DONE]':
+        # SSE 流按字节处理、JSON 载荷规定为 UTF-8，无需再从 Content-Type 嗅探 charset
+
+        # 手工的字节级行扫描：iter_lines 每块都要做 Python 层的切分与 rstrip，
+        # 长流中 delta 事件成千上万条时开销可观；这里用 bytearray 缓冲加游标，
+        # 以 C 实现的 find 定位换行，每块只在末尾删除一次已消费的前缀
+        # 直接从底层 urllib3 响应按固定 64KB 读取，绕过 requests 迭代器的
+        # 逐块包装与解码簿记；decode_content=True 交给 urllib3 处理传输压缩
+        response.raw.decode_content = True
+        raw_read = response.raw.read
+        buf = bytearray()
+        done = False
+        while True:
+            data = raw_read(65536)
+            at_eof = not data
+            if at_eof:
+                if done or not buf:
+                    break
+                # 流在最后一行缺失换行时结束：补一个 \n 让残行走同一条
+                # 解析路径，而不是把收尾事件留在缓冲区里丢掉
+                buf += b'\n'
+            else:
+                buf += data
+            # 行边界只移动下标、内容经 memoryview 零拷贝比较，
+            # 仅在真正要解析 JSON 时才物化一份 bytes
+            mv = memoryview(buf)
+            cursor = 0
+            while not done:
+                newline_at = buf.find(b'\n', cursor)
+                if newline_at < 0:
                     break
+                start, end = cursor, newline_at
+                cursor = newline_at + 1
+
+                # 首尾空白（\r/空格/制表符）直接移动下标修剪，不为 strip 拷贝整行
+                while start < end and buf[start] in _SSE_WS:
+                    start += 1
+                while end > start and buf[end - 1] in _SSE_WS:
+                    end -= 1
+                if start == end:
+                    continue
+                if end - start >= 3 and mv[start:start + 3] == b'\xef\xbb\xbf':
+                    start += 3
+                    if start == end:
+                        continue
+
+                # 处理 SSE 事件格式: "event: xxx" 和 "data: xxx"；
+                # 先看首字节（e=event, d=data）就能分类掉几乎所有行，
+                # 只有 d 开头的行才需要完整的前缀比较
+                first_byte = buf[start]
+                if first_byte == 0x65:  # b'e'，事件类型行，数据在 data 行
+                    continue
+                if first_byte != 0x64 or mv[start:start + 5] != b'data:':  # b'd'
+                    continue
+                start += 5
+                while start < end and buf[start] in _SSE_WS:
+                    start += 1
+                if mv[start:end] == b'[DONE]':
+                    done = True
+                    break
+                payload = bytes(mv[start:end])
+
+                # 快路径：纯文本 delta 事件直接用正则取出增量，不做完整 JSON 解析
+                if _DELTA_EVENT_MARK in payload:
+                    m = _DELTA_RE.search(payload)
+                    if m is not None:
+                        raw_delta = m.group(1)
+                        if b'\\' not in raw_delta:
+                            if raw_delta:
+                                piece = raw_delta.decode('utf-8')
+                                state['pieces'].append(piece)
+                                state['len'] += len(piece)
+                            continue
+
                 try:
-                    event = json.loads(payload)
+                    event = json_loads(payload)
                 except Exception as e:
                     logger.warning(f'[OpenAI Responses] JSON 解析失败: {e}, payload: {payload[:200]}')
                     continue
 
                 etype = event.get('type', '')
-                logger.info(f'[OpenAI Responses] 事件类型: {etype}')
+                # 每个事件都会经过这里，降为 DEBUG 并用惰性 % 格式化，
+                # INFO 级别下长流不再为日志逐事件做字符串插值
+                logger.debug('[OpenAI Responses] 事件类型: %s', etype)
 
-                # 提取响应元数据 (从 response.created, response.in_progress 等事件)
-                if isinstance(event.get('response'), dict):
+                # 提取响应元数据 (从 response.created, response.in_progress 等事件)；
+                # 先按事件类型过滤，占大头的 delta 事件不再做 response 字段检查
+                if etype in _META_EVENTS and isinstance(event.get('response'), dict):
                     resp = event['response']
                     model_id = resp.get('model') or model_id
                     response_id = resp.get('id') or response_id
                     created_ts = resp.get('created_at') or created_ts
-                    # 检查错误信息
-                    if resp.get('error'):
-                        error_info = resp['error']
-
-                # 处理文本增量事件: response.output_text.delta
-                if etype == 'response.output_text.delta':
-                    delta = event.get('delta', '')
-                    if delta:
-                        accumulated_text += str(delta)
-                        logger.info(f'[OpenAI Responses] 收到 delta，当前累计长度: {len(accumulated_text)}')
-
-                # 处理响应完成事件: response.completed
-                elif etype == 'response.completed':
-                    finish_reason = 'stop'
-                    resp = event.get('response', {})
-                    # 从完成事件中提取完整文本（备用，当没有收到 delta 事件时）
-                    if not accumulated_text:
-                        logger.info(f'[OpenAI Responses] 从 response.completed 提取文本')
-                        output_list = resp.get('output', [])
-                        for output_item in output_list:
-                            if output_item.get('type') == 'message':
-                                content_list = output_item.get('content', [])
-                                for content_item in content_list:
-                                    if content_item.get('type') == 'output_text':
-                                        accumulated_text += content_item.get('text', '')
-
-                # 处理响应失败事件: response.failed
-                elif etype == 'response.failed':
-                    resp = event.get('response', {})
-                    error_info = resp.get('error', {})
-                    error_code = error_info.get('code', 'unknown_error')
-                    error_message = error_info.get('message', 'The model failed to generate a response.')
-                    logger.error(f'[OpenAI Responses] 响应失败: {error_code} - {error_message}')
-                    raise Exception(f'响应失败: {error_code} - {error_message}')
-
-                # 兼容其他 delta 事件
-                elif etype and 'delta' in etype:
-                    delta = event.get('delta', '')
-                    if delta:
-                        accumulated_text += str(delta)
-                        logger.info(f'[OpenAI Responses] 收到其他 delta 事件: {etype}')
-
-        logger.info(f'[OpenAI Responses] 解析完成，文本长度: {len(accumulated_text)}')
-        logger.info(f'[OpenAI Responses] 文本内容: {accumulated_text[:200]}...' if len(accumulated_text) > 200 else f'[OpenAI Responses] 文本内容: {accumulated_text}')
+
+                # 按事件类型单次查表分发；未登记的 *.delta 事件走兼容处理
+                handler = self._EVENT_HANDLERS.get(etype)
+                if handler is not None:
+                    handler(self, event, state)
+                elif etype.endswith('.delta'):
+                    self._on_generic_delta(event, state, etype)
+
+            # 每块只删除一次已消费的前缀，未收完整的行留在缓冲区等下一块；
+            # 缩减 bytearray 前必须先释放 memoryview 的缓冲区导出
+            mv.release()
+            del buf[:cursor]
+            if done or at_eof:
+                break
+
+        accumulated_text = ''.join(state['pieces'])
+        finish_reason = state['finish_reason']
+        logger.info('[OpenAI Responses] 解析完成，文本长度: %d', len(accumulated_text))
+        # 日志只需要前 200 字符的预览，避免把整段文本塞进格式化
+        preview = accumulated_text if len(accumulated_text) <= 200 else accumulated_text[:200] + '...'
+        logger.info('[OpenAI Responses] 文本内容: %s', preview)
 
         result: Dict[str, Any] = {
             'success': True,
@@ -230,7 +365,7 @@ class OpenAIResponsesTool(Tool):
                 'serviceTier': None
             }
         }
-        logger.info(f'[OpenAI Responses] 返回结果: {json.dumps(result, ensure_ascii=False)[:500]}')
+        logger.info(f'[OpenAI Responses] 返回结果: {json_dumps(result)[:500]}')
         return result
 
     def _invoke(self, tool_parameters: Dict[str, Any]) -> Generator[ToolInvokeMessage, None, None]:
@@ -273,20 +408,6 @@ class OpenAIResponsesTool(Tool):
                     return None
                 return val
 
-            # Responses API 支持的参数
-            instructions = get_param('instructions')
-            temperature = get_param('temperature')
-            max_output_tokens = get_param('maxOutputTokens') or get_param('maxCompletionTokens')
-            top_p = get_param('topP')
-            stop = get_param('stop')
-            tools = get_param('tools')
-            tool_choice = get_param('toolChoice')
-            truncation = get_param('truncation')
-            reasoning = get_param('reasoning')
-            metadata = get_param('metadata')
-            store = get_param('store')
-            include = get_param('include')
-            previous_response_id = get_param('previousResponseId')
             stream = tool_parameters.get('stream', True)
 
             logger.info(f'[OpenAI Responses] 开始对话，模型: {model}')
@@ -294,8 +415,8 @@ class OpenAIResponsesTool(Tool):
             # 构建 input 参数
             if isinstance(messages, str):
                 try:
-                    messages = json.loads(messages)
-                except json.JSONDecodeError:
+                    messages = json_loads(messages)
+                except ValueError:
                     messages = []
 
             input_value = self._build_input(messages if isinstance(messages, list) else [], prompt)
@@ -307,65 +428,54 @@ class OpenAIResponsesTool(Tool):
                 'stream': stream
             }
 
-            # 添加可选参数
-            if instructions is not None:
-                request_body['instructions'] = instructions
-            if temperature is not None:
-                request_body['temperature'] = temperature
+            # 按映射表填充可选参数，JSON 文本形式的结构化参数统一走 _maybe_json
+            for src_key, dst_key in _PASSTHROUGH_PARAMS:
+                value = get_param(src_key)
+                if value is not None:
+                    request_body[dst_key] = value
+
+            # maxOutputTokens 兼容旧的 maxCompletionTokens 参数名
+            max_output_tokens = get_param('maxOutputTokens') or get_param('maxCompletionTokens')
             if max_output_tokens is not None:
                 request_body['max_output_tokens'] = max_output_tokens
-            if top_p is not None:
-                request_body['top_p'] = top_p
-            if stop is not None:
-                request_body['stop'] = stop
-            if tools is not None:
-                if isinstance(tools, str):
-                    try:
-                        request_body['tools'] = json.loads(tools)
-                    except json.JSONDecodeError:
-                        pass
-                else:
-                    request_body['tools'] = tools
-            if tool_choice is not None:
-                request_body['tool_choice'] = tool_choice
-            if truncation is not None:
-                request_body['truncation'] = truncation
+
+            for src_key, dst_key in _JSON_PARAMS:
+                value = get_param(src_key)
+                if value is not None:
+                    parsed = _maybe_json(value)
+                    if parsed is not None:
+                        request_body[dst_key] = parsed
+
+            reasoning = get_param('reasoning')
             if reasoning is not None:
-                if isinstance(reasoning, str):
-                    try:
-                        request_body['reasoning'] = json.loads(reasoning)
-                    except json.JSONDecodeError:
-                        request_body['reasoning'] = {'effort': reasoning}
-                else:
-                    request_body['reasoning'] = reasoning
-            if metadata is not None:
-                if isinstance(metadata, str):
-                    try:
-                        request_body['metadata'] = json.loads(metadata)
-                    except json.JSONDecodeError:
-                        pass
-                else:
-                    request_body['metadata'] = metadata
-            if store is not None:
-                request_body['store'] = store
+                parsed = _maybe_json(reasoning)
+                # 纯字符串（如 'high'）视为 effort 的简写
+                request_body['reasoning'] = parsed if parsed is not None else {'effort': reasoning}
+
+            include = get_param('include')
             if include is not None:
                 if isinstance(include, str):
                     request_body['include'] = [s.strip() for s in include.split(',')]
                 else:
                     request_body['include'] = include
-            if previous_response_id is not None:
-                request_body['previous_response_id'] = previous_response_id
 
-            request_body_string = json.dumps(request_body, ensure_ascii=False)
-            logger.info(f'[OpenAI Responses] 请求体: {request_body_string}')
+            # 请求体只序列化一次：日志与发送共用同一份 bytes，也避免
+            # requests 收到 json= 参数后再用标准库重新序列化
+            body_bytes = json_dumps_bytes(request_body)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info('[OpenAI Responses] 请求体: %s', body_bytes.decode('utf-8'))
 
             api_url = f"{host}/v1/responses"
             headers = {
                 'Content-Type': 'application/json',
-                'Authorization': f'Bearer {apiKey}'
+                'Authorization': f'Bearer {apiKey}',
+                # SSE 流要求低延迟：identity 禁止上游 gzip（压缩会按块缓冲、
+                # 推迟事件送达，解压还占 CPU），no-cache 防止中间层缓存流式响应
+                'Accept-Encoding': 'identity',
+                'Cache-Control': 'no-cache'
             }
 
-            result = self._stream_responses(api_url, headers, request_body)
+            result = self._stream_responses(api_url, headers, body_bytes)
             yield self.create_json_message(result)
         except Exception as e:
             logger.error(f'[OpenAI Responses] 异常: {str(e)}')
@@ -3,7 +3,9 @@ from typing import Any, Dict, List, Optional
 import logging
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-import requests
+
+from tools._http import session
+from tools._params import clean_params
 
 # 导入 logging 和自定义处理器
 from dify_plugin.config.logger_format import plugin_logger_handler
@@ -20,34 +22,18 @@ class SoraVideoTool(Tool):
             # 提取参数
             # 使用固定的 API host
             host = "https://api.modellink.online"
-            apiKey = tool_parameters.get('apiKey')
-            model = tool_parameters.get('model', 'sora-2')
-            prompt = tool_parameters.get('prompt')
-            seconds = tool_parameters.get('seconds', '10')
-            input_reference = tool_parameters.get('input_reference')
-            size = tool_parameters.get('size')
-            watermark = tool_parameters.get('watermark')
-            private = tool_parameters.get('private')
-            character_url = tool_parameters.get('character_url')
-            character_timestamps = tool_parameters.get('character_timestamps')
-            
-            # 处理参数值为'variable'的情况
-            def process_param(value):
-                if value == 'variable':
-                    return None
-                return value
-            
-            apiKey = process_param(apiKey)
-            model = process_param(model)
-            prompt = process_param(prompt)
-            seconds = process_param(seconds)
-            input_reference = process_param(input_reference)
-            size = process_param(size)
-            watermark = process_param(watermark)
-            private = process_param(private)
-            character_url = process_param(character_url)
-            character_timestamps = process_param(character_timestamps)
-            
+            # 单次遍历过滤掉未填写（None/''/'variable'）的参数，
+            # 替代原来逐个参数调用的 process_param
+            cleaned = clean_params(tool_parameters, (
+                'apiKey', 'model', 'prompt', 'seconds', 'input_reference', 'size',
+                'watermark', 'private', 'character_url', 'character_timestamps',
+            ))
+            apiKey = cleaned.get('apiKey')
+            model = cleaned.get('model', 'sora-2')
+            prompt = cleaned.get('prompt')
+            seconds = cleaned.get('seconds', '10')
+            size = cleaned.get('size')
+
             logger.info(f'[Sora Video] 开始生成视频，模型: {model}')
             
             # 模型参数兼容性检查
@@ -74,19 +60,12 @@ class SoraVideoTool(Tool):
                 'seconds': seconds
             }
             
-            # 添加可选参数
-            if input_reference:
-                request_data['input_reference'] = input_reference
+            # 添加可选参数（size 可能在上面的兼容性检查中被调整，单独处理）
             if size:
                 request_data['size'] = size
-            if watermark is not None:
-                request_data['watermark'] = watermark
-            if private is not None:
-                request_data['private'] = private
-            if character_url:
-                request_data['character_url'] = character_url
-            if character_timestamps:
-                request_data['character_timestamps'] = character_timestamps
+            for key in ('input_reference', 'watermark', 'private', 'character_url', 'character_timestamps'):
+                if key in cleaned:
+                    request_data[key] = cleaned[key]
             
             logger.info(f'[Sora Video] 请求数据: {request_data}')
             
@@ -96,12 +75,12 @@ class SoraVideoTool(Tool):
                 'Authorization': f'Bearer {apiKey}'
                 # 不手动设置Content-Type，requests会自动处理multipart/form-data
             }
-            
+
             # 使用 requests.post 发送 multipart/form-data 请求
             # 对于multipart/form-data，使用files参数发送
             # 将request_data转换为files格式，每个字段作为一个元组
             files = {k: (None, v) for k, v in request_data.items()}
-            response = requests.post(api_url, headers=headers, files=files, timeout=60)
+            response = session.post(api_url, headers=headers, files=files, timeout=60)
             
             logger.info(f'[Sora Video] 响应状态: {response.status_code}')
             
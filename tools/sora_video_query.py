@@ -3,7 +3,8 @@ from typing import Any
 import logging
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-import requests
+
+from tools._http import session
 
 # 导入 logging 和自定义处理器
 from dify_plugin.config.logger_format import plugin_logger_handler
@@ -32,7 +33,7 @@ class SoraVideoQueryTool(Tool):
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(api_url, headers=headers, timeout=60)
+            response = session.get(api_url, headers=headers, timeout=60)
             
             logger.info(f'[Sora Video Query] 响应状态: {response.status_code}')
             
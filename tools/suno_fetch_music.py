@@ -1,11 +1,12 @@
 from collections.abc import Generator
 from typing import Any, Dict
 import logging
-import requests
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin.config.logger_format import plugin_logger_handler
 
+from tools._http import session
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
@@ -25,7 +26,7 @@ class SunoFetchMusicTool(Tool):
             headers = {
                 'Authorization': f'Bearer {apiKey}'
             }
-            resp = requests.get(url, headers=headers, timeout=120)
+            resp = session.get(url, headers=headers, timeout=120)
             logger.info(f'[Suno Fetch] 响应状态: {resp.status_code}')
 
             if not resp.ok:
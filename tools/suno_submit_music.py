@@ -1,81 +1,150 @@
 from collections.abc import Generator
 from typing import Any, Dict
-import json
+import hashlib
 import logging
-import requests
+import threading
+import time
+from collections import OrderedDict
+from requests.exceptions import RequestException
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin.config.logger_format import plugin_logger_handler
 
+from tools._http import session
+from tools._json import json_dumps_bytes, json_loads
+
+# 不在导入时强制 setLevel，日志级别交由宿主的 logging 配置决定，
+# 线上可将本模块调到 WARNING 来关闭逐请求的 INFO 日志
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 logger.addHandler(plugin_logger_handler)
 
+# 相同请求体的进程内结果缓存（LRU + TTL）。提交接口并非幂等操作，
+# 因此默认关闭，仅当调用方显式传入 _cache_ttl（秒）时启用，
+# 用于吸收 UI 重复点击或 Agent 循环里完全一致的重复提交。
+# Dify 的多线程 worker 会并发调用 _invoke，对 _CACHE 的读写统一加锁，
+# 避免两个并发请求同时删除同一条过期条目之类的竞态
+_CACHE: OrderedDict = OrderedDict()
+_CACHE_MAX = 512
+_CACHE_LOCK = threading.Lock()
+
+# 接口地址与固定请求头为常量，提升到模块级避免每次调用重建。
+# 显式声明 Accept-Encoding: gzip 让上游压缩响应，缩小传输字节数，
+# requests/urllib3 会透明解压，调用方无感知
+_URL = "https://api.modellink.online/suno/submit/music"
+_BASE_HEADERS = {'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+
+# 参数未填写时 Dify 传入的取值。保持元组做等值扫描：frozenset 的 in
+# 会先对操作数取哈希，list/dict 这类不可哈希的值会直接 TypeError，
+# 与 tools/_params.py 的取舍一致
+_EMPTY = (None, '', 'variable')
+
+def _norm(v: Any) -> Any:
+    """参数值未填写（None/''/'variable'）时归一为 None"""
+    return None if v in _EMPTY else v
+
 class SunoSubmitMusicTool(Tool):
+    def _fail(self, message: str, error: str = '') -> ToolInvokeMessage:
+        """构造统一的失败返回"""
+        return self.create_json_message({'success': False, 'message': message, 'error': error or message})
+
     def _invoke(self, tool_parameters: Dict[str, Any]) -> Generator[ToolInvokeMessage]:
-        """提交 Suno 音乐生成任务，支持新歌与扩展模式。非流式返回结果，统一错误处理并规整空参数。"""
+        """提交 Suno 音乐生成任务，支持新歌与扩展模式。非流式返回结果，统一错误处理并规整空参数。
+
+        各失败分支显式 yield 后返回，try 只包住真正会抛异常的网络与解析步骤，
+        正常路径不再背一层包住整个方法的 except。
+        """
+        apiKey = tool_parameters.get('apiKey')
+        prompt = tool_parameters.get('prompt')
+        mv = tool_parameters.get('mv')
+        title = tool_parameters.get('title')
+
+        # 必填参数先行校验，缺失时直接返回，不再花费 body 构建与序列化日志的开销
+        missing = [name for name, value in (
+            ('apiKey', apiKey), ('prompt', prompt), ('mv', mv), ('title', title),
+        ) if not value]
+        if missing:
+            message = '缺少必填参数: ' + '、'.join(missing)
+            logger.error('[Suno Submit] %s', message)
+            yield self._fail(message)
+            return
+
+        tags = _norm(tool_parameters.get('tags'))
+        task = _norm(tool_parameters.get('task'))
+        continue_at = _norm(tool_parameters.get('continue_at'))
+        continue_clip_id = _norm(tool_parameters.get('continue_clip_id'))
+
+        # 可选参数一次性并入，body 单次构建完成，不再逐键条件赋值
+        optional = (('tags', tags), ('task', task),
+                    ('continue_at', continue_at), ('continue_clip_id', continue_clip_id))
+        body: Dict[str, Any] = {
+            'prompt': prompt,
+            'mv': mv,
+            'title': title,
+            **{k: v for k, v in optional if v is not None}
+        }
+
+        # 请求体只序列化一次：日志与发送共用同一份 bytes，也避免
+        # requests 收到 json= 参数后再用标准库重新序列化
+        body_bytes = json_dumps_bytes(body)
+        # 请求体全文属于调试信息，降为 DEBUG；未开启时连 decode 都不做
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('[Suno Submit] 请求体: %s', body_bytes.decode('utf-8'))
+
+        # 缓存命中时直接复用最近一次的响应，省去 120s 超时档的网络往返
         try:
-            host = "https://api.modellink.online"
-            apiKey = tool_parameters.get('apiKey')
-            prompt = tool_parameters.get('prompt')
-            mv = tool_parameters.get('mv')
-            title = tool_parameters.get('title')
-
-            def _norm(v: Any) -> Any:
-                return None if v in (None, '', 'variable') else v
-
-            tags = _norm(tool_parameters.get('tags'))
-            task = _norm(tool_parameters.get('task'))
-            continue_at = _norm(tool_parameters.get('continue_at'))
-            continue_clip_id = _norm(tool_parameters.get('continue_clip_id'))
-
-            if not apiKey:
-                raise Exception('缺少 apiKey')
-            if not prompt or not mv or not title:
-                raise Exception('prompt、mv、title 为必填参数')
-
-            body: Dict[str, Any] = {
-                'prompt': prompt,
-                'mv': mv,
-                'title': title
-            }
-            if tags is not None:
-                body['tags'] = tags
-            if task is not None:
-                body['task'] = task
-            if continue_at is not None:
-                body['continue_at'] = continue_at
-            if continue_clip_id is not None:
-                body['continue_clip_id'] = continue_clip_id
-
-            logger.info(f'[Suno Submit] 请求体: {json.dumps(body, ensure_ascii=False)}')
-
-            url = f"{host}/suno/submit/music"
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {apiKey}'
-            }
-            try:
-                resp = requests.post(url, headers=headers, json=body, timeout=120)
-            except requests.exceptions.RequestException as e:
-                logger.error(f'[Suno Submit] 网络异常: {str(e)}')
-                yield self.create_json_message({'success': False, 'message': '网络异常，无法连接到 Model Link API', 'error': str(e)})
+            cache_ttl = float(tool_parameters.get('_cache_ttl') or 0)
+        except (TypeError, ValueError):
+            cache_ttl = 0
+        cache_key = None
+        if cache_ttl > 0:
+            cache_key = hashlib.sha256(body_bytes + apiKey.encode('utf-8')).hexdigest()
+            # 只在锁内做查找与清理，yield 留到锁外，生成器挂起时不持锁
+            cached_data = None
+            with _CACHE_LOCK:
+                cached = _CACHE.get(cache_key)
+                if cached is not None:
+                    cached_at, value = cached
+                    if time.monotonic() - cached_at < cache_ttl:
+                        _CACHE.move_to_end(cache_key)
+                        cached_data = value
+                    else:
+                        _CACHE.pop(cache_key, None)
+            if cached_data is not None:
+                logger.info('[Suno Submit] 命中结果缓存，跳过网络请求')
+                yield self.create_json_message({'success': True, 'message': '任务提交成功', 'data': cached_data})
                 return
 
-            logger.info(f'[Suno Submit] 响应状态: {resp.status_code}')
+        headers = {**_BASE_HEADERS, 'Authorization': 'Bearer ' + apiKey}
+        try:
+            # (连接超时, 读取超时)：连接阶段的 DNS/TCP/TLS 卡顿 5 秒即失败，
+            # 不再占着 worker 等满 120 秒
+            resp = session.post(_URL, headers=headers, data=body_bytes, timeout=(5, 120))
+        except RequestException as e:
+            msg = str(e)
+            logger.error('[Suno Submit] 网络异常: %s', msg)
+            yield self._fail('网络异常，无法连接到 Model Link API', msg)
+            return
+
+        logger.info('[Suno Submit] 响应状态: %d', resp.status_code)
 
-            if not resp.ok:
-                err = resp.text
-                logger.error(f'[Suno Submit] 错误响应: {err}')
-                yield self.create_json_message({'success': False, 'message': err, 'error': err})
-                return
+        if not resp.ok:
+            err = resp.text
+            logger.error('[Suno Submit] 错误响应: %s', err)
+            yield self._fail(err)
+            return
+
+        # 直接对 resp.content 的 bytes 解析，省去 resp.json() 内部
+        # 先整体解码成 str 再用标准库解析的两步开销
+        try:
+            data = json_loads(resp.content)
+        except Exception:
+            data = {'raw': resp.text}
 
-            try:
-                data = resp.json()
-            except Exception:
-                data = {'raw': resp.text}
+        if cache_key is not None:
+            with _CACHE_LOCK:
+                _CACHE[cache_key] = (time.monotonic(), data)
+                _CACHE.move_to_end(cache_key)
+                while len(_CACHE) > _CACHE_MAX:
+                    _CACHE.popitem(last=False)
 
-            yield self.create_json_message({'success': True, 'message': '任务提交成功', 'data': data})
-        except Exception as e:
-            logger.error(f'[Suno Submit] 异常: {str(e)}')
-            yield self.create_json_message({'success': False, 'message': str(e) or '任务提交失败', 'error': str(e)})
+        yield self.create_json_message({'success': True, 'message': '任务提交成功', 'data': data})